@@ -3,7 +3,8 @@
 
 """
 Requirements:
-    None
+    numpy
+    numba (optional, compiles the election loop to machine code)
 
 Usage:
     add the votes in the get_votes function and run the script
@@ -17,9 +18,19 @@ Description:
 from __future__ import annotations
 
 # Built-in/Generic Imports
-from typing import Dict, Text, Tuple, List, Optional
+from typing import AbstractSet, Callable, Dict, Text, Tuple, List
 from dataclasses import dataclass, field
+from functools import lru_cache
 from math import ceil
+from sys import intern
+
+# Libs
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Without numba the election runs on the numpy rounds of `IRV` by default
+    njit = None
 
 __author__ = "Marios Paraskevas"
 __date__ = "23/02/2022"
@@ -31,15 +42,17 @@ __status__ = "production"
 ELIGIBILITY_THRESHOLD = 2 / 3
 PARTICIPATION_THRESHOLD = 3 / 4
 ELIGIBLE_VOTERS = 5
+QUORUM = ceil(ELIGIBLE_VOTERS * PARTICIPATION_THRESHOLD)
+USE_KERNEL = njit is not None  # Runs the election on the compiled kernel instead of numpy rounds
 proposals = ("p1", "p2", "p3")
 
 
-@dataclass
-class Votes(Dict):
+@dataclass(slots=True)
+class Votes:
     """Dataclass for a Ballot Vote Interface"""
 
-    in_favour: List = field(default=None)
-    against: List = field(default=None)
+    in_favour: List[Text] = field(default_factory=list)
+    against: List[Text] = field(default_factory=list)
 
 
 # A ballot is a collection of proposals
@@ -47,42 +60,47 @@ class Ballot:
     """The Ballot incorporates is a template for differentiates between the types of votes
     and validates the vote's business logic"""
 
-    def __init__(self, proposals: Tuple[Text], votes: Votes) -> None:
-        self.proposals, self.votes = proposals, votes
+    def __init__(self, votes: Votes) -> None:
+        self.votes = votes
+        # The proposals the user is in favour of and against, resolved once as plain lists, with an
+        # explicit None read as no votes. The names are interned, so that set and dict lookups on
+        # them compare by identity
+        self.in_favour: List[Text] = [intern(proposal) for proposal in votes.in_favour or []]
+        self.against: List[Text] = [intern(proposal) for proposal in votes.against or []]
         self.all_votes = [*self.against, *self.in_favour]
-        self.validate()
 
-    @property
-    def in_favour(self) -> Optional[List[Text]]:
-        """Gets the proposals that the user is in favour of
+    def validate(self, proposals: AbstractSet[Text]) -> None:
+        """The business logic of a ballot
 
-        Returns:
-            Optional[List[Text]]: proposals
+        Args:
+            proposals (AbstractSet[Text]): the proposals that can be voted
         """
 
-        return self.votes.in_favour or []
+        voted = set(self.all_votes)
 
-    @property
-    def against(self) -> Optional[List[Text]]:
-        """Gets the proposals that the user is against of
+        # This is a check to see if the user has voted the same proposal twice.
+        if len(voted) != len(self.all_votes):
+            raise ValueError("You cannot vote the same proposal twice")
 
-        Returns:
-            Optional[List[Text]]: proposals
-        """
+        # This is a check to see if the user has voted a proposal that shouldn't be voted.
+        if not voted.issubset(proposals):
+            for voted_proposal in self.all_votes:
+                if voted_proposal not in proposals:
+                    raise ValueError(f"{voted_proposal} doesn't exist as a choice")
 
-        return self.votes.against or []
 
-    def validate(self) -> None:
-        """The business logic of a ballot"""
+def ranking_dtype(size: int) -> np.dtype:
+    """Gets the narrowest integer type that holds the proposal indices of a ranking matrix. Up to
+    127 proposals a ballot's row is one byte per preference, so small rows share a cache line
 
-        # This is a check to see if the user has voted the same proposal twice.
-        if sorted(self.all_votes) != sorted(set(self.all_votes)):
-            exit("You cannot vote the same proposal twice")
+    Args:
+        size (int): the number of proposals
 
-        # This is a check to see if the user has voted a proposal that shouldn't be voted.
-        for voted_proposal in self.all_votes:
-            if voted_proposal not in self.proposals:
-                exit(f"{voted_proposal} doesn't exist as a choice")
+    Returns:
+        np.dtype: int8, or int16 for larger elections
+    """
+
+    return np.dtype(np.int8 if size <= np.iinfo(np.int8).max else np.int16)
 
 
 # `BallotBox` is a class that represents a ballot box. It has a list of ballots and a size.
@@ -90,8 +108,58 @@ class BallotBox:
     """The ballot box encapsulates all ballots and validates the inputs. It also whether there
     enough votes in the box in order to have a valid election"""
 
-    def __init__(self) -> None:
+    def __init__(self, proposals: Tuple[Text]) -> None:
+        if not proposals:
+            raise ValueError("The ballot box needs at least one proposal")
+
+        self.size: int = len(proposals)
+        self.proposals: Tuple[Text] = proposals
+        self.index: Dict[Text, int] = {
+            intern(proposal): idx for idx, proposal in enumerate(proposals)
+        }
+        # Shared by all the ballots for validation, instead of a tuple scan per vote
+        self._proposal_set: AbstractSet[Text] = frozenset(self.index)
+
         self.entries: List[Ballot] = []
+        self._buffer: np.ndarray = np.empty((16, self.size), dtype=ranking_dtype(self.size))
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @classmethod
+    def from_arrays(cls, proposals: Tuple[Text], rankings: np.ndarray) -> BallotBox:
+        """Builds a box straight from a ranking matrix, validating all the ballots at once instead
+        of going through a `Ballot` per voter. The box keeps no `entries` for these ballots
+
+        Args:
+            proposals (Tuple[Text]): the proposals of the election
+            rankings (np.ndarray): the (ballots x proposals) ranking matrix, each row holding the
+                indices of the proposals a voter is in favour of in order, padded with -1
+
+        Returns:
+            BallotBox: the box holding the ballots
+        """
+
+        rankings = np.asarray(rankings)
+        if not np.issubdtype(rankings.dtype, np.integer):
+            raise ValueError("The rankings must hold integer proposal indices")
+
+        if rankings.ndim != 2 or rankings.shape[1] != len(proposals):
+            raise ValueError("The rankings must have one column per proposal")
+
+        if ((rankings < -1) | (rankings >= len(proposals))).any():
+            raise ValueError("The rankings contain a proposal that doesn't exist as a choice")
+
+        ordered = np.sort(rankings, axis=1)
+        if ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] != -1)).any():
+            raise ValueError("You cannot vote the same proposal twice")
+
+        box = cls(proposals)
+        # Always a copy, so that the box owns a writable buffer rather than the caller's array
+        box._buffer = np.array(rankings, dtype=ranking_dtype(len(proposals)), order="C")
+        box._count = len(rankings)
+        return box
 
     def addBallot(self, ballot: Ballot) -> None:
         """Adds the ballot to the box and validates it
@@ -99,21 +167,124 @@ class BallotBox:
         Args:
             ballot (Ballot):the ballot to be added in the box
         """
-        if len(self.entries) == 0:
-            self.size: int = len(ballot.proposals)
+        ballot.validate(self._proposal_set)
 
-        if (
-            len(ballot.proposals) != self.size
-        ):  # Checks if all the ballots are of the same proposals
-            exit(f"{ballot.__str__} cannot be added to Ballot Box")
+        # Grows the ranking buffer geometrically so that appending stays amortized O(1)
+        n = self._count
+        if n == len(self._buffer):
+            grown = np.empty((max(2 * n, 16), self.size), dtype=self._buffer.dtype)
+            grown[:n] = self._buffer
+            self._buffer = grown
+
+        row = self._buffer[n]
+        row.fill(-1)
+        row[: len(ballot.in_favour)] = [self.index[p] for p in ballot.in_favour]
 
         self.entries.append(ballot)
+        self._count += 1
+
+    @property
+    def rankings(self) -> np.ndarray:
+        """Gets the ranking matrix of the box, one row per ballot and one column per preference
+        position. Each cell holds the index of the proposal, or -1 if the position is empty
+
+        Returns:
+            np.ndarray: the (ballots x proposals) ranking matrix
+        """
+
+        return self._buffer[: self._count]
 
     def validate_participation(self) -> None:
         """Validates the participation threshold"""
 
-        if len(self.entries) < ceil(ELIGIBLE_VOTERS * PARTICIPATION_THRESHOLD):
-            exit("This vote has not enough ballots to be considered valid")
+        if len(self) < QUORUM:
+            raise ValueError("This vote has not enough ballots to be considered valid")
+
+
+@lru_cache(maxsize=None)
+def make_kernel(size: int) -> Callable[[np.ndarray, np.ndarray, int], int]:
+    """
+    Builds the election loop for a fixed number of proposals. `size` is a constant of the closure,
+    so numba compiles every loop over the proposals with a known trip count and can unroll them.
+    The kernels are built once per number of proposals.
+
+    :param size: The number of proposals
+    :type size: int
+    :return: The `run_irv` kernel for that number of proposals.
+    """
+
+    def run_irv(rankings: np.ndarray, head: np.ndarray, threshold: int) -> int:
+        """
+        Runs the whole election over the ranking matrix in plain loops, so that it can be compiled
+        by numba. It moves the `head` of every ballot in place and leaves `rankings` untouched.
+
+        :param rankings: The (ballots x proposals) ranking matrix, -1 marking an empty position
+        :type rankings: np.ndarray
+        :param head: The position of the current top choice of every ballot
+        :type head: np.ndarray
+        :param threshold: The number of votes a proposal needs in order to be accepted
+        :type threshold: int
+        :return: The index of the accepted proposal, or -1 if no proposal was accepted.
+        """
+
+        counter = np.zeros(size, np.int64)
+
+        # The ballots that still have a top choice, compacted every round as ballots get exhausted.
+        live = np.arange(rankings.shape[0])
+        remaining = live.size
+
+        # The eliminated proposals as a bitset, proposal `r` being bit `r & 63` of word `r >> 6`. Up
+        # to 63 proposals it is a single word, so every membership test is a shift and a mask. The
+        # -1 of the empty positions lands on the top bit of the last word, which is never a proposal
+        # and is set so that they are always skipped.
+        eliminated = np.zeros(size // 64 + 1, np.int64)
+        eliminated[-1] = np.int64(1) << 63
+
+        while True:
+
+            # Tally the top choices, moving every head past the eliminated proposals on the way.
+            counter[:] = 0
+            kept = 0
+            for j in range(remaining):
+                i = live[j]
+                h = head[i]
+                while h < size:
+                    r = rankings[i, h]
+                    if not (eliminated[r >> 6] >> (r & 63)) & 1:
+                        break
+                    h += 1
+                head[i] = h
+                if h < size:
+                    counter[rankings[i, h]] += 1
+                    live[kept] = i
+                    kept += 1
+            remaining = kept
+
+            # A single scan for the most prominent proposal and the least votes.
+            best, least = 0, 0
+            for p in range(size):
+                votes = counter[p]
+                if votes > counter[best]:
+                    best = p
+                if votes > 0 and (least == 0 or votes < least):
+                    least = votes
+
+            if counter[best] >= threshold:
+                return best
+
+            if remaining == 0:
+                return -1
+
+            # Eliminate every proposal that got the least votes.
+            for p in range(size):
+                if counter[p] == least:
+                    eliminated[p >> 6] |= np.int64(1) << (p & 63)
+
+    if njit is not None:
+        signature = f"int64({ranking_dtype(size).name}[:, ::1], int32[::1], int64)"
+        run_irv = njit(signature, cache=True)(run_irv)
+
+    return run_irv
 
 
 # IRV is a voting system that uses ranked ballots to elect a single winner
@@ -122,36 +293,59 @@ class IRV:
 
     def __init__(self, ballot_box: BallotBox) -> None:
         self.ballot_box = ballot_box
-        self.results()
 
-    def results(self):
+    def reset(self) -> None:
+        """Takes the current ballots of the box and sets every ballot back to its first choice"""
+
+        self.rankings = self.ballot_box.rankings
+        self._pass_threshold = ceil(len(self.ballot_box) * ELIGIBILITY_THRESHOLD)
+        self.head = np.zeros(len(self.rankings), dtype=np.int32)
+
+    def reset_rounds(self) -> None:
+        """Sets up the state of the numpy rounds, with no proposal eliminated. The kernel keeps its
+        own, so this only runs when the election goes through the rounds"""
+
+        # The last slot stands for the -1 of the empty positions, so that they are skipped as well
+        self.eliminated = np.zeros(self.rankings.shape[1] + 1, dtype=bool)
+        self.eliminated[-1] = True
+        # The ballots that still have a top choice, each live ballot being one vote of the round,
+        # along with that top choice
+        self.live = np.arange(len(self.rankings))
+        self.top = self.rankings[self.live, self.head[self.live]]
+        self.advance_heads()
+
+    def run(self) -> int:
         """
-        If the most prominent proposal is accepted, then break out of the loop. Otherwise, discard the
-        least prominent proposal and continue
+        If the most prominent proposal is accepted, then stop. Otherwise, discard the least prominent
+        proposal and continue. Every call runs a new election over the ballot box
+
+        :return: The index of the accepted proposal, or -1 if no proposal was accepted.
         """
 
         self.ballot_box.validate_participation()
+        self.reset()
+
+        if USE_KERNEL:
+            run_irv = make_kernel(self.rankings.shape[1])
+            return run_irv(self.rankings, self.head, self._pass_threshold)
+
+        self.reset_rounds()
 
         while True:
 
-            stats = (
-                self.round_stats()
-            )  # Dictionary with the number of votes for each proposal.
-            prominent_proposal = self.find_most_prominent(stats)
+            stats = self.round_stats()  # Array with the number of votes for each proposal.
+            prominent, prominent_votes, least_votes = self.scan_stats(stats)
 
             # This is a check to see if the prominent proposal has enough votes to be accepted.
-            if self.passes(prominent_proposal[1]):
-                print(f"{prominent_proposal[0]} is accepted")
-                break
-
-            min_votes = self.find_least_prominent(stats)
-            self.discard(min_votes)
+            if self.passes(prominent_votes):
+                return prominent
 
             # This is a check to see if there are any votes left in the ballot box. If there are no
             # votes left, then there is no need to continue with the election.
-            if not sum(i > 0 for i in stats.values()):
-                print("No proposal was accepted")
-                break
+            if not self.live.size:
+                return -1
+
+            self.discard(self.find_least_prominent(stats, least_votes))
 
     def passes(self, prominent_vote_count: int) -> bool:
         """
@@ -163,77 +357,83 @@ class IRV:
         :return: A boolean value.
         """
 
-        return prominent_vote_count >= ceil(
-            len(self.ballot_box.entries) * ELIGIBILITY_THRESHOLD
-        )
+        return prominent_vote_count >= self._pass_threshold
 
-    def find_most_prominent(self, stats: Dict[Text, int]) -> List[Text]:
+    def scan_stats(self, stats: np.ndarray) -> Tuple[int, int, int]:
         """
-        Find the most prominent words in a dictionary of word counts
+        Scan the round's stats once for the most prominent proposal and the least votes a proposal
+        got
 
-        :param stats: A dictionary of the stats for each word
-        :type stats: Dict[Text, int]
-        :return: The most prominent words in the text.
+        :param stats: The number of votes of each proposal, indexed by proposal
+        :type stats: np.ndarray
+        :return: The index of the most prominent proposal, its number of votes and the least non-zero
+        number of votes (0 if there are no votes).
         """
 
-        return max(stats.items(), key=lambda x: x[1])
+        counts = stats.tolist()
+        prominent, least_votes = 0, 0
 
-    def find_least_prominent(self, stats: Dict[Text, int]) -> List[Text]:
-        """
-        Find the least prominent feature in the dataset
+        for idx, votes in enumerate(counts):
+            if votes > counts[prominent]:
+                prominent = idx
+            if votes and (not least_votes or votes < least_votes):
+                least_votes = votes
+
+        return prominent, counts[prominent], least_votes
 
-        :param stats: A dictionary of the form {word: frequency}
-        :type stats: Dict[Text, int]
-        :return: The least prominent words in the text.
+    def find_least_prominent(self, stats: np.ndarray, least_votes: int) -> np.ndarray:
         """
+        Find the least prominent proposals out of the round's stats
 
-        removed_zeros = stats
-        for k, v in stats.copy().items():
-            if v == 0:
-                stats.pop(k)
+        :param stats: The number of votes of each proposal, indexed by proposal
+        :type stats: np.ndarray
+        :param least_votes: The least non-zero number of votes of the round
+        :type least_votes: int
+        :return: The indices of the least prominent proposals.
+        """
 
-        return [
-            k
-            for k, v in removed_zeros.items()
-            if v == min(removed_zeros.items(), key=lambda x: x[1])[1]
-        ]
+        return np.flatnonzero(stats == least_votes)
 
-    def init_counter(self) -> Dict[Text, int]:
+    def round_stats(self) -> np.ndarray:
         """
-        Initialize a dictionary with the number of votes for each proposal
-        :return: The `init_counter` method returns a dictionary with the keys being the proposals and
-        the values being the number of votes for each proposal.
+        * Count the cached top choice of every live ballot in a single bincount
+
+        :return: An array with the number of votes for each proposal, indexed by proposal.
         """
 
-        return {proposal: 0 for proposal in self.ballot_box.entries[0].proposals}
+        return np.bincount(self.top, minlength=self.rankings.shape[1])
 
-    def round_stats(self) -> Dict[Text, int]:
+    def discard(self, least_prominent: np.ndarray) -> None:
         """
-        * For each ballot in the ballot box, add one to the counter for the candidate that was voted for
+        Eliminate the least prominent proposals from the election
 
-        :return: A dictionary with the candidate names as keys and the number of votes as values.
+        :param least_prominent: The indices of the proposals that are to be discarded
+        :type least_prominent: np.ndarray
         """
 
-        counter = self.init_counter()
-
-        for ballot in self.ballot_box.entries:
-            if len(ballot.in_favour) > 0:
-                counter[ballot.in_favour[0]] += 1
-
-        return counter
+        self.eliminated[least_prominent] = True
+        self.advance_heads()
 
-    def discard(self, least_prominent: List[Text]) -> None:
+    def advance_heads(self) -> None:
         """
-        Remove the least prominent proposals from the ballot box
-
-        :param least_prominent: A list of proposals that are to be discarded
-        :type least_prominent: List[Text]
+        Move the head of every live ballot whose top choice was eliminated to its next choice, keep
+        the cached top choices in line and drop the ballots that got exhausted
         """
 
-        for proposal in least_prominent:
-            for ballot in self.ballot_box.entries:
-                if proposal in ballot.in_favour:
-                    ballot.in_favour.remove(proposal)
+        size = self.rankings.shape[1]
+        moving = np.flatnonzero(self.eliminated[self.top])  # Positions in `live` to move
+
+        # Only the ballots whose top choice is still eliminated keep moving, so every pass shrinks
+        while moving.size:
+            rows = self.live[moving]
+            self.head[rows] += 1
+            left = self.head[rows] < size
+            moving, rows = moving[left], rows[left]
+            self.top[moving] = self.rankings[rows, self.head[rows]]
+            moving = moving[self.eliminated[self.top[moving]]]
+
+        live = self.head[self.live] < size
+        self.live, self.top = self.live[live], self.top[live]
 
 
 def get_votes() -> List[Votes]:
@@ -248,9 +448,17 @@ def get_votes() -> List[Votes]:
 
 
 if __name__ == "__main__":
-    ballot_box = BallotBox()
+    ballot_box = BallotBox(proposals)
     votes = get_votes()
-    for vote in votes:
-        ballot_box.addBallot(Ballot(proposals, vote))
-
-    IRV(ballot_box)
+    try:
+        for vote in votes:
+            ballot_box.addBallot(Ballot(vote))
+
+        winner = IRV(ballot_box).run()
+    except ValueError as error:
+        exit(error)
+
+    if winner >= 0:
+        print(f"{proposals[winner]} is accepted")
+    else:
+        print("No proposal was accepted")
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Usage:
+    python -m unittest test_irv
+
+Description:
+    Checks the validation of ballots and ballot boxes, and that `BallotBox.from_arrays` elects the
+    same proposal as a box filled through `addBallot`.
+"""
+
+# Built-in/Generic Imports
+from typing import List, Text, Tuple
+from unittest.mock import patch
+import unittest
+
+# Libs
+import numpy as np
+
+# Own modules
+import irv
+from irv import IRV, Ballot, BallotBox, Votes
+
+PROPOSALS = ("p1", "p2", "p3")
+
+
+def box_from_votes(proposals: Tuple[Text], votes: List[List[Text]]) -> BallotBox:
+    """Returns a box filled through `addBallot` with one ballot per list of votes in favour"""
+
+    box = BallotBox(proposals)
+    for in_favour in votes:
+        box.addBallot(Ballot(Votes(in_favour=in_favour)))
+
+    return box
+
+
+def rankings_from_votes(proposals: Tuple[Text], votes: List[List[Text]]) -> np.ndarray:
+    """Returns the ranking matrix of the lists of votes in favour"""
+
+    rankings = np.full((len(votes), len(proposals)), -1)
+    for row, in_favour in enumerate(votes):
+        rankings[row, : len(in_favour)] = [proposals.index(p) for p in in_favour]
+
+    return rankings
+
+
+class BallotTest(unittest.TestCase):
+    """Tests for the validation of single ballots"""
+
+    def test_rejects_duplicate_vote(self) -> None:
+        with self.assertRaises(ValueError):
+            BallotBox(PROPOSALS).addBallot(Ballot(Votes(in_favour=["p1"], against=["p1"])))
+
+    def test_rejects_unknown_proposal(self) -> None:
+        with self.assertRaises(ValueError):
+            BallotBox(PROPOSALS).addBallot(Ballot(Votes(in_favour=["p4"])))
+
+    def test_accepts_explicit_none(self) -> None:
+        ballot = Ballot(Votes(in_favour=["p1"], against=None))
+
+        self.assertEqual(ballot.in_favour, ["p1"])
+        self.assertEqual(ballot.against, [])
+
+
+class FromArraysTest(unittest.TestCase):
+    """Tests for building a ballot box straight from a ranking matrix"""
+
+    def test_rejects_no_proposals(self) -> None:
+        with self.assertRaises(ValueError):
+            BallotBox(())
+
+        with self.assertRaises(ValueError):
+            BallotBox.from_arrays((), np.empty((5, 0), dtype=int))
+
+    def test_rejects_wrong_shape(self) -> None:
+        with self.assertRaises(ValueError):
+            BallotBox.from_arrays(PROPOSALS, np.array([[0, 1]] * 4))
+
+        with self.assertRaises(ValueError):
+            BallotBox.from_arrays(PROPOSALS, np.array([0, 1, 2]))
+
+    def test_rejects_out_of_range_index(self) -> None:
+        with self.assertRaises(ValueError):
+            BallotBox.from_arrays(PROPOSALS, np.array([[0, 3, -1]] * 4))
+
+        with self.assertRaises(ValueError):
+            BallotBox.from_arrays(PROPOSALS, np.array([[-2, 0, -1]] * 4))
+
+    def test_rejects_duplicate_preference(self) -> None:
+        with self.assertRaises(ValueError):
+            BallotBox.from_arrays(PROPOSALS, np.array([[0, 1, 1]] * 4))
+
+    def test_rejects_non_integer_rankings(self) -> None:
+        with self.assertRaises(ValueError):
+            BallotBox.from_arrays(PROPOSALS, np.array([[0.2, 0.7, -1]] * 4))
+
+    def test_copies_read_only_rankings(self) -> None:
+        rankings = np.array([[0, 1, -1]] * 4, dtype=np.int8)
+        rankings.setflags(write=False)
+
+        box = BallotBox.from_arrays(PROPOSALS, rankings)
+
+        self.assertFalse(np.shares_memory(rankings, box.rankings))
+        self.assertEqual(IRV(box).run(), 0)
+
+
+class ElectionTest(unittest.TestCase):
+    """Tests for running elections, on both the compiled kernel and the numpy rounds"""
+
+    def assertElects(self, winner: int, box: BallotBox) -> None:
+        """Checks that both election implementations accept the same proposal"""
+
+        for use_kernel in (True, False):
+            with self.subTest(use_kernel=use_kernel), patch.object(irv, "USE_KERNEL", use_kernel):
+                self.assertEqual(IRV(box).run(), winner)
+
+    def test_elects_as_add_ballot(self) -> None:
+        votes = [
+            ["p1", "p2", "p3"],
+            ["p2", "p1"],
+            ["p3", "p2"],
+            ["p2"],
+            ["p3", "p1"],
+            ["p2", "p3"],
+        ]
+
+        self.assertElects(1, box_from_votes(PROPOSALS, votes))
+        rankings = rankings_from_votes(PROPOSALS, votes)
+        self.assertElects(1, BallotBox.from_arrays(PROPOSALS, rankings))
+
+    def test_rejects_below_quorum(self) -> None:
+        box = box_from_votes(PROPOSALS, [["p1"]] * (irv.QUORUM - 1))
+
+        with self.assertRaises(ValueError):
+            IRV(box).run()
+
+    def test_runs_again_on_current_ballots(self) -> None:
+        for use_kernel in (True, False):
+            with self.subTest(use_kernel=use_kernel), patch.object(irv, "USE_KERNEL", use_kernel):
+                box = box_from_votes(PROPOSALS, [["p1"]] * 3 + [["p2"]])
+                election = IRV(box)
+
+                self.assertEqual(election.run(), 0)
+                self.assertEqual(election.run(), 0)
+
+                for _ in range(5):
+                    box.addBallot(Ballot(Votes(in_favour=["p2"])))
+
+                self.assertEqual(election.run(), 1)
+
+    def test_elects_beyond_int8_proposals(self) -> None:
+        proposals = tuple(f"p{idx}" for idx in range(1, 201))
+        # Three rounds: ten proposals tied at 3 votes, then two tied at 15, then p200 gets all 30
+        votes = [[proposals[128 + i % 10], proposals[150 + i % 2], "p200"] for i in range(30)]
+
+        added = box_from_votes(proposals, votes)
+        from_arrays = BallotBox.from_arrays(proposals, rankings_from_votes(proposals, votes))
+
+        self.assertEqual(added.rankings.dtype, np.int16)
+        self.assertEqual(from_arrays.rankings.dtype, np.int16)
+        self.assertElects(199, added)
+        self.assertElects(199, from_arrays)
+
+
+if __name__ == "__main__":
+    unittest.main()